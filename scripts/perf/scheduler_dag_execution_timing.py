@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+from __future__ import annotations
+
+import collections
+import gc
+import json
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+
+class _Watch:
+    """
+    Per-dag completion bookkeeping for ShortCircuitExecutorMixin.
+
+    Slotted because it is touched on every task-completion callback - slot
+    access skips the instance __dict__ and the struct itself is far smaller
+    than the Namespace it replaces.
+    """
+
+    __slots__ = ("waiting_for", "success_counts")
+
+    def __init__(self, waiting_for):
+        self.waiting_for = waiting_for
+        # Count of SUCCESS transitions seen per run - change_state is called
+        # exactly once per terminal transition, so a run is complete once
+        # this reaches the dag's task count
+        self.success_counts = collections.Counter()
+
+
+class ShortCircuitExecutorMixin:
+    """Mixin class to manage the scheduler state during the performance test run."""
+
+    def __init__(self, dag_ids_to_watch, num_runs, task_counts):
+        from airflow.utils.state import TaskInstanceState
+
+        super().__init__()
+        self.num_runs_per_dag = num_runs
+        # Bound once here so change_state doesn't go through the import
+        # machinery on every callback
+        self._success_state = TaskInstanceState.SUCCESS
+        # Number of tasks in each watched dag, computed once at harness init
+        # so completion checks don't have to load the dag or its task
+        # instances
+        self._task_counts = task_counts
+        self.reset(dag_ids_to_watch)
+
+    def reset(self, dag_ids_to_watch):
+        """Capture the value that determines when the scheduler is reset."""
+        # Aggregate of all waiting_for values, kept in sync as runs complete
+        # so logging doesn't need to scan dags_to_watch on the hot path
+        self._total_waiting = len(dag_ids_to_watch) * self.num_runs_per_dag
+        self.dags_to_watch = {dag_id: _Watch(self.num_runs_per_dag) for dag_id in dag_ids_to_watch}
+
+    def change_state(self, key, state, info=None, remove_running=False):
+        """
+        Change the state of scheduler by waiting till the tasks is complete.
+
+        Then shut down the scheduler after the task is complete.
+        """
+        super().change_state(key, state, info=info, remove_running=remove_running)
+
+        dag_id, _, run_id, __, ___ = key
+        if dag_id not in self.dags_to_watch:
+            return
+
+        if state != self._success_state:
+            return
+
+        # This fn is called before the DagRun state is updated, so we can't
+        # check the DR.state - instead we count terminal SUCCESS transitions
+        # per run, which needs no queries at all
+        watched_dag = self.dags_to_watch[dag_id]
+        watched_dag.success_counts[run_id] += 1
+        if watched_dag.success_counts[run_id] == self._task_counts[dag_id]:
+            del watched_dag.success_counts[run_id]
+            watched_dag.waiting_for -= 1
+            self._total_waiting -= 1
+
+            if watched_dag.waiting_for == 0:
+                del self.dags_to_watch[dag_id]
+
+            if not self.dags_to_watch:
+                self.log.warning("STOPPING SCHEDULER -- all runs complete")
+                self.job_runner.num_runs = 1
+            elif self._total_waiting % 100 == 0:
+                # Log progress occasionally rather than once per callback -
+                # emitting a record per task completion is pure harness
+                # overhead
+                self.log.warning("WAITING ON %d RUNS", self._total_waiting)
+
+
+def get_executor_under_test(dotted_path):
+    """Create and return a MockExecutor."""
+    from airflow.executors.executor_loader import ExecutorLoader
+
+    if dotted_path == "MockExecutor":
+        from tests_common.test_utils.mock_executor import MockExecutor as executor
+
+    else:
+        executor = ExecutorLoader.load_executor(dotted_path)
+        executor = type(executor)
+
+    # Change this to try other executors
+    class ShortCircuitExecutor(ShortCircuitExecutorMixin, executor):
+        """Placeholder class that implements the inheritance hierarchy."""
+
+        job_runner = None
+
+    return ShortCircuitExecutor
+
+
+def reset_dags(dag_ids, session):
+    """Delete all dag and task instances and then un_pause the given Dags."""
+    import airflow.models
+
+    DR = airflow.models.DagRun
+    DM = airflow.models.DagModel
+    TI = airflow.models.TaskInstance
+
+    dag_ids = list(dag_ids)
+
+    # One statement per table for the whole batch of dags, instead of three
+    # statements (and three SQL compiles) per dag
+    session.query(TI).filter(TI.dag_id.in_(dag_ids)).delete(synchronize_session=False)
+    session.query(DR).filter(DR.dag_id.in_(dag_ids)).delete(synchronize_session=False)
+    session.query(DM).filter(DM.dag_id.in_(dag_ids)).update(
+        {"is_paused": False}, synchronize_session=False
+    )
+
+
+def pause_all_dags(session):
+    """Pause all Dags."""
+    from airflow.models.dag import DagModel
+
+    session.query(DagModel).update({"is_paused": True})
+
+
+def create_dag_runs(dag, num_runs, session):
+    """Create `num_runs` of dag runs for sub-sequent schedules."""
+    from airflow.models.dagrun import DagRun
+    from airflow.utils import timezone
+    from airflow.utils.state import DagRunState
+    from airflow.utils.types import DagRunTriggeredByType, DagRunType
+
+    run_infos = []
+    last_dagrun_data_interval = None
+    for _ in range(num_runs):
+        next_info = dag.next_dagrun_info(last_dagrun_data_interval)
+        run_infos.append(next_info)
+        last_dagrun_data_interval = next_info.data_interval
+
+    # One bulk INSERT instead of a flush per run - dag.create_dagrun() would
+    # go through the full ORM unit of work for every row
+    now = timezone.utcnow()
+    session.bulk_insert_mappings(
+        DagRun,
+        [
+            {
+                "dag_id": dag.dag_id,
+                "run_id": f"{DagRunType.SCHEDULED.value}__{info.logical_date.isoformat()}",
+                "logical_date": info.logical_date,
+                "data_interval_start": info.data_interval.start,
+                "data_interval_end": info.data_interval.end,
+                "run_after": info.run_after,
+                "run_type": DagRunType.SCHEDULED,
+                "triggered_by": DagRunTriggeredByType.TIMETABLE,
+                "_state": DagRunState.RUNNING,
+                "start_date": now,
+            }
+            for info in run_infos
+        ],
+    )
+
+
+def reduce_scheduling_noise():
+    """
+    Pin the process to a single CPU and raise its scheduling priority.
+
+    CPU migration and preemption are the dominant sources of run-to-run
+    variance here, not the code under test. Best effort: each step is
+    skipped silently where the platform or privileges don't allow it. The
+    target CPU can be chosen with the PERF_CPU environment variable.
+    """
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {int(os.environ.get("PERF_CPU", "0"))})
+        except OSError:
+            pass
+    if hasattr(os, "sched_setscheduler"):
+        try:
+            # Needs root; keeps us from being preempted by normal processes
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(1))
+            return
+        except OSError:
+            pass
+    try:
+        os.nice(-10)
+    except OSError:
+        pass
+
+
+def run_single_measurement(num_runs, pre_create_dag_runs, executor_class, dag_ids, dagbag_pickle=None):
+    """
+    Set up a clean DB state and time a single scheduler execution.
+
+    This is run in a fresh subprocess per repeat (via the hidden
+    ``--single-run`` flag) so that every measurement sees identically cold
+    SQLAlchemy and allocator caches, instead of later repeats benefiting from
+    state warmed up by earlier ones.
+
+    If ``dagbag_pickle`` is given, the DagBag is loaded from that file
+    instead of re-parsing the dag folder - the parent process parses once and
+    every repeat reloads the identical result from disk.
+
+    Returns the elapsed wall-clock time as integer nanoseconds.
+    """
+    from airflow.jobs.job import Job, run_job
+    from airflow.jobs.scheduler_job_runner import SchedulerJobRunner
+    from airflow.models.dagbag import DagBag
+    from airflow.utils.session import create_session
+
+    if dagbag_pickle:
+        with open(dagbag_pickle, "rb") as f:
+            dagbag = pickle.load(f)
+    else:
+        dagbag = DagBag()
+    dags = [dagbag.get_dag(dag_id) for dag_id in dag_ids]
+
+    with create_session() as session:
+        pause_all_dags(session)
+        for dag in dags:
+            dag.sync_to_db(session=session)
+        reset_dags(dag_ids, session)
+
+        if pre_create_dag_runs:
+            for dag in dags:
+                create_dag_runs(dag, num_runs, session)
+
+        # Make sure no ORM objects from the set-up phase stay attached to the
+        # session, or they would be flushed during the timed run
+        session.expunge_all()
+
+    ShortCircuitExecutor = get_executor_under_test(executor_class)
+
+    task_counts = {dag.dag_id: len(dag.tasks) for dag in dags}
+    executor = ShortCircuitExecutor(dag_ids_to_watch=dag_ids, num_runs=num_runs, task_counts=task_counts)
+    scheduler_job = Job(executor=executor)
+    job_runner = SchedulerJobRunner(job=scheduler_job, num_runs=0)
+    executor.job_runner = job_runner
+
+    # Drain any garbage left over from set-up, then move every surviving
+    # object to the permanent generation so a collection during the timed
+    # region can neither be triggered by nor has to traverse them
+    gc.collect()
+    gc.collect()
+    gc.freeze()
+    gc.disable()
+    # Raise the switch interval above the 5ms default so background threads
+    # preempt the measurement less often
+    sys.setswitchinterval(0.05)
+
+    # Pure-Python profiling fallback for environments where py-spy can't
+    # ptrace; only ever covers the timed region
+    profiler = None
+    if "CPROFILE" in os.environ:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # Integer nanoseconds - perf_counter() floats lose sub-us resolution once
+    # the counter has been running for a while
+    start = time.perf_counter_ns()
+
+    run_job(job=job_runner.job, execute_callable=job_runner._execute)
+
+    run_time_ns = time.perf_counter_ns() - start
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(os.environ.get("CPROFILE_O", f"cprofile-{os.getpid()}.prof"))
+
+    gc.enable()
+    gc.unfreeze()
+    return run_time_ns
+
+
+@click.command()
+@click.option("--num-runs", default=1, help="number of DagRun, to run for each DAG")
+@click.option("--single-run", is_flag=True, default=False, hidden=True)
+@click.option("--dagbag-pickle", default=None, hidden=True)
+@click.option("--min-repeat", default=3, help="minimum number of times to run the test")
+@click.option(
+    "--max-repeat",
+    default=10,
+    help="maximum number of times to run the test; the loop stops early once "
+    "the running minimum stops improving",
+)
+@click.option(
+    "--pre-create-dag-runs",
+    is_flag=True,
+    default=False,
+    help="""Pre-create the dag runs and stop the scheduler creating more.
+
+        Warning: this makes the scheduler do (slightly) less work so may skew your numbers. Use sparingly!
+        """,
+)
+@click.option(
+    "--executor-class",
+    default="MockExecutor",
+    help="Dotted path Executor class to test, or "
+    "'MockExecutor' to use the mock executor from the test suite",
+)
+@click.option("--warmup", default=0, help="number of untimed warm-up runs before measurement starts")
+@click.option(
+    "--human",
+    is_flag=True,
+    default=False,
+    help="print human-readable progress and summary instead of JSON lines",
+)
+@click.argument("dag_ids", required=True, nargs=-1)
+def main(
+    num_runs,
+    single_run,
+    dagbag_pickle,
+    min_repeat,
+    max_repeat,
+    pre_create_dag_runs,
+    executor_class,
+    warmup,
+    human,
+    dag_ids,
+):
+    """
+    Measure how long it takes for the scheduler to execute the given DAGs.
+
+    This script can be used to measure changes to the hot path of the
+    scheduler: it runs the scheduler with a short-circuiting executor until
+    the requested number of dag runs for each given dag_id have completed,
+    and reports the wall-clock time taken.
+    """
+    reduce_scheduling_noise()
+
+    # Turn on unit test mode so that we don't do any sleep() in the scheduler
+    # loop - not needed, not helpful for performance
+    os.environ["AIRFLOW__CORE__UNIT_TEST_MODE"] = "True"
+
+    os.environ["AIRFLOW__CORE__MAX_ACTIVE_TASKS_PER_DAG"] = "500"
+
+    if single_run:
+        run_time_ns = run_single_measurement(
+            num_runs, pre_create_dag_runs, executor_class, dag_ids, dagbag_pickle=dagbag_pickle
+        )
+        print(f"TIME={run_time_ns / 1e9:.9f}")
+        return
+
+    from airflow.models.dagbag import DagBag
+
+    dagbag = DagBag()
+
+    dags = []
+
+    import datetime
+
+    from airflow.timetables.interval import DeltaDataIntervalTimetable
+
+    for dag_id in dag_ids:
+        dag = dagbag.get_dag(dag_id)
+        dags.append(dag)
+
+        next_info = dag.next_dagrun_info(None)
+
+        timetable = dag.timetable
+        if isinstance(timetable, DeltaDataIntervalTimetable) and isinstance(
+            timetable._delta, datetime.timedelta
+        ):
+            # Regular schedule: the nth logical date is just n deltas after
+            # the first, no need to walk the schedule one run at a time
+            last_logical_date = next_info.logical_date + (num_runs - 1) * timetable._delta
+        else:
+            for _ in range(num_runs - 1):
+                next_info = dag.next_dagrun_info(next_info.data_interval)
+            last_logical_date = next_info.logical_date
+
+        end_date = dag.end_date or dag.default_args.get("end_date")
+        if end_date != last_logical_date:
+            message = (
+                f"DAG {dag_id} has incorrect end_date ({end_date}) for number of runs! "
+                f"It should be "
+                f" {last_logical_date}"
+            )
+            sys.exit(message)
+
+    # dag.tasks rebuilds its list on every access, so count once per dag
+    task_counts = {dag.dag_id: len(dag.tasks) for dag in dags}
+    total_tasks = sum(task_counts.values())
+
+    pyspy_proc = None
+    if "PYSPY" in os.environ:
+        pid = str(os.getpid())
+        filename = os.environ.get("PYSPY_O", "flame-" + pid + ".html")
+        # --subprocesses follows the measurement children, which is where
+        # the timed work happens. No sudo wrapper: run the harness itself
+        # with the needed privileges (or relax yama/ptrace_scope) so the
+        # profiler lifetime is under our control
+        pyspy_proc = subprocess.Popen(
+            ["py-spy", "record", "-o", filename, "-p", pid, "--idle", "--subprocesses", "--native"]
+        )
+
+    # Parse the dag folder exactly once - every measurement subprocess
+    # reloads the pickled result instead of re-parsing
+    dagbag_pickle_fd, dagbag_pickle_path = tempfile.mkstemp(prefix="perf_dagbag_", suffix=".pkl")
+    with os.fdopen(dagbag_pickle_fd, "wb") as f:
+        pickle.dump(dagbag, f)
+
+    single_run_cmd = [sys.executable, __file__, "--single-run", "--num-runs", str(num_runs)]
+    single_run_cmd.extend(["--dagbag-pickle", dagbag_pickle_path])
+    if pre_create_dag_runs:
+        single_run_cmd.append("--pre-create-dag-runs")
+    single_run_cmd.extend(["--executor-class", executor_class, *dag_ids])
+
+    # Optional untimed warm-up runs, e.g. to populate OS page and database
+    # caches; their results are simply discarded. Every timed repeat already
+    # does its own reset-and-rebuild in a fresh subprocess, so all samples
+    # measure the same code path.
+    for count in range(warmup):
+        result = subprocess.run(single_run_cmd, capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            sys.exit(f"Warm-up subprocess failed:\n{result.stdout}\n{result.stderr}")
+        if human:
+            print(f"Warm-up run {count + 1} complete")
+
+    times = []
+    # Stop repeating once this many consecutive runs fail to improve the
+    # running minimum by more than CONVERGENCE_THRESHOLD - timer/OS noise is
+    # then dominating the signal and more samples won't help.
+    CONVERGENCE_RUNS = 3
+    CONVERGENCE_THRESHOLD = 0.01
+    runs_without_improvement = 0
+
+    for count in range(max_repeat):
+        result = subprocess.run(single_run_cmd, capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            sys.exit(f"Measurement subprocess failed:\n{result.stdout}\n{result.stderr}")
+
+        for line in result.stdout.splitlines():
+            if line.startswith("TIME="):
+                run_time = float(line.removeprefix("TIME="))
+                break
+        else:
+            sys.exit(f"Could not find TIME= in measurement subprocess output:\n{result.stdout}")
+
+        if times and run_time < min(times) * (1 - CONVERGENCE_THRESHOLD):
+            runs_without_improvement = 0
+        else:
+            runs_without_improvement += 1
+        times.append(run_time)
+
+        if human:
+            print(f"Run {count + 1} time: {run_time:.5f} (best so far: {min(times):.5f})")
+        else:
+            print(json.dumps({"run": count + 1, "time": run_time, "best": min(times)}))
+
+        if count + 1 >= min_repeat and runs_without_improvement >= CONVERGENCE_RUNS:
+            if human:
+                print(f"Converged after {count + 1} runs")
+            break
+
+    if pyspy_proc:
+        pyspy_proc.terminate()
+        pyspy_proc.wait()
+
+    os.unlink(dagbag_pickle_path)
+
+    best = min(times)
+    if human:
+        print()
+        print()
+        print(f"Time for {num_runs} dag runs of {len(dags)} dags with {total_tasks} total tasks: ", end="")
+        if len(times) > 1:
+            # Run-to-run noise is strictly additive delay, so the minimum is
+            # the best estimate of the true runtime; the mean is kept only as
+            # a secondary diagnostic.
+            print(f"{best:.4f}s (best of {len(times)}, mean {statistics.mean(times):.4f}s)")
+        else:
+            print(f"{best:.4f}s")
+
+        print()
+        print()
+    else:
+        from airflow import __version__ as airflow_version
+
+        # Full sample vector plus aggregates, one JSON object on one line, so
+        # regression tooling doesn't have to regex-parse human text
+        print(
+            json.dumps(
+                {
+                    "samples": times,
+                    "min": best,
+                    "median": statistics.median(times),
+                    "mean": statistics.mean(times),
+                    "stdev": statistics.pstdev(times),
+                    "num_runs": num_runs,
+                    "num_dags": len(dags),
+                    "total_tasks": total_tasks,
+                    "python": sys.version,
+                    "airflow": airflow_version,
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()